@@ -1,9 +1,78 @@
+import os
+import shutil
+import sys
+import tempfile
+import textwrap
+
+from setuptools import Extension
+from setuptools.command.build_ext import build_ext
 from Cython.Build import cythonize
 
 exclude_list = [
 #    "sample_package/excluded_module/**",
 ]
 compiler_directives = {"language_level": 3, "embedsignature": True}
+extensions = [
+    Extension(
+        "efc._base_fast",
+        ["efc/_base_fast.pyx"],
+    )
+]
+
+
+def openmp_flags(compiler):
+    """Return the (compile, link) flags enabling OpenMP for this compiler."""
+    if compiler.compiler_type == "msvc":
+        return ["/openmp"], []
+    if sys.platform == "darwin":
+        # Apple clang has no bundled OpenMP runtime, it needs libomp installed
+        return ["-Xpreprocessor", "-fopenmp"], ["-lomp"]
+    return ["-fopenmp"], ["-fopenmp"]
+
+
+def has_openmp(compiler, compile_args, link_args):
+    """Check that a small OpenMP program compiles and links with these flags."""
+    code = textwrap.dedent(
+        """\
+        #include <omp.h>
+        int main(void) { return omp_get_max_threads() > 0 ? 0 : 1; }
+        """
+    )
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(tmp_dir, "test_openmp.c")
+        with open(source, "w") as f:
+            f.write(code)
+        objects = compiler.compile(
+            [source], output_dir=tmp_dir, extra_postargs=compile_args
+        )
+        compiler.link_executable(
+            objects, "test_openmp", output_dir=tmp_dir, extra_postargs=link_args
+        )
+    except Exception:
+        return False
+    finally:
+        shutil.rmtree(tmp_dir)
+    return True
+
+
+class BuildExt(build_ext):
+    """Builds the extension with OpenMP when the compiler supports it.
+
+    The kernels use cython.parallel, which runs serially when the extension
+    is compiled without OpenMP.
+    """
+
+    def build_extensions(self):
+        compile_args, link_args = openmp_flags(self.compiler)
+        if has_openmp(self.compiler, compile_args, link_args):
+            for ext in self.extensions:
+                ext.extra_compile_args += compile_args
+                ext.extra_link_args += link_args
+        else:
+            print("OpenMP is not available, efc will be built without it.")
+        super().build_extensions()
+
 
 def build(setup_kwargs):
     setup_kwargs.update(
@@ -11,6 +80,7 @@ def build(setup_kwargs):
             "name": "efc",
             "package": ["efc"],
             # https://cython.readthedocs.io/en/latest/src/userguide/source_files_and_compilation.html#cythonize-arguments
-            "ext_modules": cythonize("efc/_base_fast.pyx"),
+            "ext_modules": cythonize(extensions),
+            "cmdclass": {"build_ext": BuildExt},
         }
-    )
\ No newline at end of file
+    )
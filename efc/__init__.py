@@ -1,6 +1,13 @@
 from ._energyclassifier import EnergyBasedFlowClassifier
 
-from ._base_fast import coupling, local_fields, site_freq, pair_freq, compute_energy
+from ._base_fast import (
+    coupling,
+    local_fields,
+    site_freq,
+    pair_freq,
+    compute_energy,
+    compute_energy_multi,
+)
 
 from ._version import __version__
 
@@ -11,5 +18,6 @@ __all__ = [
     "pair_freq",
     "site_freq",
     "compute_energy",
+    "compute_energy_multi",
     "__version__",
 ]
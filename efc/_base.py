@@ -30,6 +30,11 @@ class BaseEFC(ClassifierMixin, BaseEstimator):
     cutoff_quantile : float, default=`0.95`
         The quantile used to define the model's energy threshold. It must be in range `(0,1)`.
 
+    n_threads : int, default=None
+        The number of OpenMP threads used by the fitting kernels. ``None`` and
+        ``-1`` mean the OpenMP default. Set to 1 when several estimators are
+        fitted in parallel threads.
+
     Attributes
     ----------
 
@@ -39,7 +44,7 @@ class BaseEFC(ClassifierMixin, BaseEstimator):
     sitefreq_ : ndarray, shape (n_feature, max_bin)
         Observed frequency of attribute values ​​in each attribute.
 
-    pairfreq_ : ndarray, shape (n_feature, max_bin, n_feature, max_bin)
+    pairfreq_ : ndarray, shape (n_feature*max_bin, n_feature*max_bin)
         Observed frequency of attribute value pairs in attribute pairs.
 
     coupling_matrix_ : ndarray, shape (n_feature*max_bin, n_feature*max_bin)
@@ -52,10 +57,13 @@ class BaseEFC(ClassifierMixin, BaseEstimator):
 
     """
 
-    def __init__(self, max_bin=30, pseudocounts=0.5, cutoff_quantile=0.95):
+    def __init__(
+        self, max_bin=30, pseudocounts=0.5, cutoff_quantile=0.95, n_threads=None
+    ):
         self.max_bin = max_bin
         self.pseudocounts = pseudocounts
         self.cutoff_quantile = cutoff_quantile
+        self.n_threads = n_threads
 
     """
     
@@ -73,18 +81,16 @@ class BaseEFC(ClassifierMixin, BaseEstimator):
     """
 
     def fit(self, X):
-        self.X_ = X
+        self.X_ = np.ascontiguousarray(X)
         self.sitefreq_ = self._site_freq()
         self.pairfreq_ = self._pair_freq()
         self.coupling_matrix_ = self._coupling()
         self.local_fields_ = self._local_fields()
-        self.coupling_matrix_ = np.log(self.coupling_matrix_)
-        self.local_fields_ = np.log(self.local_fields_)
-        self.cutoff_ = self._define_cutoff()
+        self.cutoff_ = self._define_cutoff(self._compute_energy(self.X_))
         return self
 
     def _site_freq(self):
-        return site_freq(self.X_, self.pseudocounts, self.max_bin)
+        return site_freq(self.X_, self.pseudocounts, self.max_bin, self.n_threads)
 
     def _pair_freq(self):
         return pair_freq(self.X_, self.sitefreq_, self.pseudocounts, self.max_bin)
@@ -102,9 +108,10 @@ class BaseEFC(ClassifierMixin, BaseEstimator):
         )
 
     def _compute_energy(self, X):
-        return compute_energy(self, X)
+        return compute_energy(self, X, self.n_threads)
 
-    def _define_cutoff(self):
-        energies = compute_energy(self, self.X_)
-        energies = np.sort(energies, axis=None)
-        return energies[int(energies.shape[0] * self.cutoff_quantile)]
+    def _define_cutoff(self, energies):
+        # energies is a scratch buffer owned by fit, partition it in place
+        k = int(energies.shape[0] * self.cutoff_quantile)
+        energies.partition(k)
+        return energies[k]
@@ -1,148 +1,311 @@
 import numpy as np
 cimport cython
+from cython.parallel import prange, parallel, threadid
+from libc.math cimport log
 
 # cython: profile=True
 # cython: linetrace=True
 # cython: binding=True
 # distutils: define_macros=CYTHON_TRACE_NOGIL=1
 
+# discretized samples may be passed as uint8/uint16 to cut memory traffic,
+# int64 is kept for callers that pass plain integer arrays
+ctypedef fused bin_t:
+    unsigned char
+    unsigned short
+    long long
+
+cdef extern from *:
+    """
+    #ifdef _OPENMP
+    #include <omp.h>
+    #define efc_max_threads() omp_get_max_threads()
+    #else
+    #define efc_max_threads() 1
+    #endif
+    """
+    int efc_max_threads() nogil
+
+
+cdef int thread_count(n_threads) except -1:
+    # None and -1 use the OpenMP default, the team is 1 thread without OpenMP
+    if n_threads is None or n_threads == -1:
+        return efc_max_threads()
+    if n_threads < 1:
+        raise ValueError(
+            f"n_threads must be None, -1 or a positive integer, got {n_threads}."
+        )
+    return n_threads
+
+
+cdef check_bins(X_view, int max_bin):
+    # the kernels use the values of X as indices without bounds checks
+    X = np.asarray(X_view)
+    if X.size > 0 and (X.min() < 0 or X.max() >= max_bin):
+        raise ValueError("The values of X must be in the range [0, max_bin).")
+
+
+cdef check_shape(name, tuple shape, tuple expected):
+    # the kernels index their arrays without bounds checks
+    if shape != expected:
+        raise ValueError(f"{name} has shape {shape}, expected {expected}.")
+
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cdef cantor(long long [:] x, long long [:] y):
-    output = np.empty(x.shape[0], dtype='double')
-    cdef double [:] output_view = output
-    cdef int i 
-    for i in range(x.shape[0]):
-        output_view[i] = (x[i] + y[i]) * (x[i] + y[i] + 1) / 2 + y[i]
-    return output
-
-def site_freq(long long [:, :] X_view,
+def site_freq(bin_t [:, :] X_view,
             double psdcounts,
-            int max_bin):
-            
+            int max_bin,
+            n_threads=None):
+    cdef int i, r, aa
+    cdef int num_threads = thread_count(n_threads)
+    cdef int n_inst = X_view.shape[0]
     cdef int n_attr = X_view.shape[1]
     sitefreq = np.zeros((n_attr, max_bin), dtype='double')
-    
+
     cdef double [:, :] sitefreq_view = sitefreq
 
-    for i in range(n_attr):
-        for aa in range(max_bin):
-            sitefreq_view[i, aa] = np.sum(np.equal(X_view[:, i], aa))
+    check_bins(X_view, max_bin)
 
-    sitefreq /= X_view.shape[0]
-    sitefreq = ((1 - psdcounts) * sitefreq
-                + psdcounts / max_bin)
+    # each feature fills its own row, so features are counted in parallel
+    for i in prange(n_attr, nogil=True, schedule='static', num_threads=num_threads):
+        for r in range(n_inst):
+            sitefreq_view[i, X_view[r, i]] += 1.0
+        for aa in range(max_bin):
+            sitefreq_view[i, aa] = ((1 - psdcounts) * (sitefreq_view[i, aa] / n_inst)
+                                    + psdcounts / max_bin)
 
     return sitefreq
 
 
-# @cython.cdivision(True)
-def pair_freq(long long [:, :] X_view,
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def pair_freq(bin_t [:, :] X_view,
             double [:, :] sitefreq_view,
             double psdcounts,
             int max_bin):
-    cdef int i, j, count, ai, aj, item, x
+    cdef int i, j, r, ai, aj, row
     cdef int n_inst = X_view.shape[0]
     cdef int n_attr = X_view.shape[1]
-    pairfreq = np.zeros((n_attr, max_bin, n_attr, max_bin),
+    pairfreq = np.zeros((n_attr * max_bin, n_attr * max_bin),
                         dtype='double')
 
-    cdef double [:, :, :, :] pairfreq_view = pairfreq
+    cdef double [:, ::1] pairfreq_view = pairfreq
+
+    check_bins(X_view, max_bin)
+    check_shape("sitefreq", (sitefreq_view.shape[0], sitefreq_view.shape[1]),
+                (n_attr, max_bin))
 
-    for i in range(n_attr):
-        for j in range(n_attr):
-            c = cantor(X_view[:,i],X_view[:,j])
-            unique,aaIdx = np.unique(c,True)
-            for x, item in enumerate(unique):
-                pairfreq_view[i, X_view[aaIdx[x],i],j,X_view[aaIdx[x],j]] = np.sum(np.equal(c,item))
+    # each sample only increments the cells of the value pairs it holds, so
+    # unobserved cells are never touched. Pair counts are symmetric, so only
+    # the upper blocks (i < j) are counted and then mirrored; the diagonal
+    # blocks are overwritten below
+    with nogil:
+        for r in range(n_inst):
+            for i in range(n_attr):
+                row = i * max_bin + X_view[r, i]
+                for j in range(i + 1, n_attr):
+                    pairfreq_view[row, j * max_bin + X_view[r, j]] += 1.0
 
+    pairfreq += pairfreq.T
     pairfreq /= n_inst
     pairfreq = (1-psdcounts)*pairfreq + psdcounts/(max_bin**2)
 
-    cdef double [:, :, :, :] pairfreq_new_view = pairfreq
-
+    cdef double [:, :] pairfreq_new_view = pairfreq
 
-    for i in range(n_attr):
-        for ai in range(max_bin):
-            for aj in range(max_bin):
-                if (ai==aj):
-                    pairfreq_new_view[i,ai,i,aj] = sitefreq_view[i,ai]
-                else:
-                    pairfreq_new_view[i,ai,i,aj] = 0.0
+    with nogil:
+        for i in range(n_attr):
+            for ai in range(max_bin):
+                for aj in range(max_bin):
+                    if (ai==aj):
+                        pairfreq_new_view[i * max_bin + ai, i * max_bin + aj] = sitefreq_view[i,ai]
+                    else:
+                        pairfreq_new_view[i * max_bin + ai, i * max_bin + aj] = 0.0
     return pairfreq
 
 
-def coupling(double [:, :, :, :] pairfreq_view,
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def coupling(double [:, :] pairfreq_view,
             double [:, :] sitefreq_view, 
             double psdcounts, 
             int max_bin):
-    cdef int i, j, ai, aj
+    cdef int i, j, ai, aj, row, pair_row
+    cdef double freq_i
     cdef int n_attr = sitefreq_view.shape[0]
     corr_matrix = np.empty((n_attr * (max_bin - 1),
                             n_attr * (max_bin - 1)), dtype='double')
 
     cdef double [:, :] corr_matrix_view = corr_matrix
 
+    check_shape("sitefreq", (sitefreq_view.shape[0], sitefreq_view.shape[1]),
+                (n_attr, max_bin))
+    check_shape("pairfreq", (pairfreq_view.shape[0], pairfreq_view.shape[1]),
+                (n_attr * max_bin, n_attr * max_bin))
 
-    for i in range(n_attr):
-        for j in range(n_attr):
-            for ai in range(max_bin - 1):
-                for aj in range(max_bin - 1):
-                    corr_matrix_view[i * (max_bin - 1) + ai,
-                                j * (max_bin - 1) + aj] = (pairfreq_view[i, ai, j, aj]
-                                                                - sitefreq_view[i, ai]
-                                                                * sitefreq_view[j, aj])
+    # the row terms are fixed along aj, so the inner loop is a single
+    # multiply-subtract per cell
+    with nogil:
+        for i in range(n_attr):
+            for j in range(n_attr):
+                for ai in range(max_bin - 1):
+                    row = i * (max_bin - 1) + ai
+                    pair_row = i * max_bin + ai
+                    freq_i = sitefreq_view[i, ai]
+                    for aj in range(max_bin - 1):
+                        corr_matrix_view[row, j * (max_bin - 1) + aj] = (
+                            pairfreq_view[pair_row, j * max_bin + aj]
+                            - freq_i * sitefreq_view[j, aj])
 
     inv_corr = np.linalg.inv(corr_matrix_view)
-    return np.exp(np.negative(inv_corr))
+    # log(exp(-inv_corr)), the couplings are returned in log space
+    return np.negative(inv_corr)
 
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
 def local_fields(double [:, :] coupling_view, 
-                double [:, :, :, :] pairfreq_view, 
+                double [:, :] pairfreq_view, 
                 double [:, :] sitefreq_view, 
                 double psdcounts, 
                 int max_bin):
     cdef int i, ai, j, aj
+    cdef double field
     cdef int n_inst = sitefreq_view.shape[0]
     fields = np.zeros((n_inst * (max_bin - 1)), dtype='double')
     cdef double [:] fields_view = fields
 
-    for i in range(n_inst):
-        for ai in range(max_bin - 1):
-            fields_view[i * (max_bin - 1) + ai] = (sitefreq_view[i, ai]
-                                                    / sitefreq_view[i, max_bin - 1])
-            for j in range(n_inst):
-                for aj in range(max_bin - 1):
-                    fields_view[i * (max_bin - 1) + ai] = fields_view[i *       (max_bin - 1) + ai] / (
-                        coupling_view[i * (max_bin - 1) + ai, j * (max_bin - 1) + aj]**sitefreq_view[j, aj])
+    check_shape("sitefreq", (sitefreq_view.shape[0], sitefreq_view.shape[1]),
+                (n_inst, max_bin))
+    check_shape("coupling", (coupling_view.shape[0], coupling_view.shape[1]),
+                (n_inst * (max_bin - 1), n_inst * (max_bin - 1)))
+
+    # fields are accumulated in log space, coupling_view already holds log couplings
+    with nogil:
+        for i in range(n_inst):
+            for ai in range(max_bin - 1):
+                field = log(sitefreq_view[i, ai] / sitefreq_view[i, max_bin - 1])
+                for j in range(n_inst):
+                    for aj in range(max_bin - 1):
+                        field -= (coupling_view[i * (max_bin - 1) + ai, j * (max_bin - 1) + aj]
+                                  * sitefreq_view[j, aj])
+                fields_view[i * (max_bin - 1) + ai] = field
 
     return fields
 
 
-def compute_energy(self, X):
-    cdef int n_inst = X.shape[0]
-    cdef int n_attr = X.shape[1]
-    cdef int i, j, k, j_value, k_value
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline void sample_indices(bin_t [:, :] X_view,
+                                int i,
+                                int max_bin,
+                                int *idx) nogil:
+    # matrix index of each feature value of sample i, -1 for the last bin
+    # which is left out of the coupling matrix and local fields
+    cdef int f, value
+    for f in range(X_view.shape[1]):
+        value = X_view[i, f]
+        if value != (max_bin - 1):
+            idx[f] = f * (max_bin - 1) + value
+        else:
+            idx[f] = -1
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def compute_energy(self, bin_t [:, :] X_view, n_threads=None):
+    cdef int n_inst = X_view.shape[0]
+    cdef int n_attr = X_view.shape[1]
+    cdef int i, j, k, tid
+    cdef int num_threads = thread_count(n_threads)
     cdef double e
+    cdef int *idx
     cdef int max_bin = self.max_bin
+    cdef int [:, ::1] idx_view = np.empty((num_threads, n_attr), dtype=np.intc)
 
     energies = np.empty(n_inst, dtype='double')
 
-    cdef long long [:, :] X_view = X
     cdef double [:] energies_view = energies
+    # strided: the classifier's estimators hold views into its packed array
     cdef double [:, :] coupling_view = self.coupling_matrix_
     cdef double [:] fields_view = self.local_fields_
+    cdef int n_params = n_attr * (max_bin - 1)
+
+    check_bins(X_view, max_bin)
+    check_shape("coupling_matrix_", (coupling_view.shape[0], coupling_view.shape[1]),
+                (n_params, n_params))
+    check_shape("local_fields_", (fields_view.shape[0],), (n_params,))
+
+    # samples are independent, e is written as e = e - ... so that prange
+    # keeps it thread private instead of turning it into a reduction.
+    # Each thread uses its own row of idx_view as index buffer
+    with nogil, parallel(num_threads=num_threads):
+        tid = threadid()
+        idx = &idx_view[tid, 0]
+
+        for i in prange(n_inst, schedule='static'):
+            sample_indices(X_view, i, max_bin, idx)
+            e = 0
+            for j in range(n_attr - 1):
+                if idx[j] >= 0:
+                    for k in range(j, n_attr):
+                        if idx[k] >= 0:
+                            e = e - coupling_view[idx[j], idx[k]]
+                    e = e - fields_view[idx[j]]
+            energies_view[i] = e
+    return energies
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def compute_energy_multi(double [:, :, ::1] coupling_fields_view,
+                        bin_t [:, :] X_view,
+                        int max_bin,
+                        n_threads=None):
+    # coupling_fields_view[c] holds the local fields of class c in column 0
+    # and its coupling matrix in the remaining columns, so the field and the
+    # couplings read for a feature value share one row
+    cdef int n_classes = coupling_fields_view.shape[0]
+    cdef int n_inst = X_view.shape[0]
+    cdef int n_attr = X_view.shape[1]
+    cdef int i, j, k, c, row, col, tid
+    cdef int num_threads = thread_count(n_threads)
+    cdef int *idx
+    cdef double *acc
+    cdef int [:, ::1] idx_view = np.empty((num_threads, n_attr), dtype=np.intc)
+    cdef double [:, ::1] acc_view = np.empty((num_threads, n_classes), dtype='double')
+
+    energies = np.empty((n_classes, n_inst), dtype='double')
+    cdef double [:, :] energies_view = energies
+    cdef int n_params = n_attr * (max_bin - 1)
+
+    check_bins(X_view, max_bin)
+    check_shape("coupling_fields",
+                (coupling_fields_view.shape[1], coupling_fields_view.shape[2]),
+                (n_params, n_params + 1))
+
+    # same summation order as compute_energy, but X is swept once and the
+    # matrix indices of each pair are shared by all classes. The energies of
+    # a sample are accumulated in a thread local row and stored once
+    with nogil, parallel(num_threads=num_threads):
+        tid = threadid()
+        idx = &idx_view[tid, 0]
+        acc = &acc_view[tid, 0]
 
-    for i in range(n_inst):
-        e = 0
-        for j in range(n_attr - 1):
-            j_value = X_view[i, j]
-            if j_value != (max_bin - 1):
-                for k in range(j, n_attr):
-                    k_value = X_view[i, k]
-                    if k_value != (max_bin - 1):
-                        e -= (coupling_view[j * (max_bin - 1)
-                                                    + j_value, k * (max_bin - 1) + k_value])
-                e -= (fields_view[j * (max_bin - 1) + j_value])
-        energies_view[i] = e
-    return energies
\ No newline at end of file
+        for i in prange(n_inst, schedule='static'):
+            sample_indices(X_view, i, max_bin, idx)
+            for c in range(n_classes):
+                acc[c] = 0
+            for j in range(n_attr - 1):
+                row = idx[j]
+                if row >= 0:
+                    for k in range(j, n_attr):
+                        col = idx[k]
+                        if col >= 0:
+                            for c in range(n_classes):
+                                acc[c] = acc[c] - coupling_fields_view[c, row, col + 1]
+                    for c in range(n_classes):
+                        acc[c] = acc[c] - coupling_fields_view[c, row, 0]
+            for c in range(n_classes):
+                energies_view[c, i] = acc[c]
+    return energies
@@ -13,9 +13,10 @@ from sklearn.preprocessing import MaxAbsScaler, KBinsDiscretizer
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 
-from joblib import Parallel, delayed
+from joblib import Parallel, delayed, effective_n_jobs
 
 from ._base import BaseEFC
+from ._base_fast import compute_energy_multi
 
 
 class EnergyBasedFlowClassifier(ClassifierMixin, BaseEstimator):
@@ -36,8 +37,8 @@ class EnergyBasedFlowClassifier(ClassifierMixin, BaseEstimator):
         Using the quantile strategy.
 
     n_jobs : int, default=None
-        The number of parallel jobs to run on :meth:`fit`
-        and :meth:`predict`. ``None`` means 1 unless in a
+        The number of parallel jobs to run on :meth:`fit` and
+        of threads used by :meth:`predict`. ``None`` means 1 unless in a
         :obj:`joblib.parallel_backend` context. ``-1`` means
         using all processors.
 
@@ -63,6 +64,11 @@ class EnergyBasedFlowClassifier(ClassifierMixin, BaseEstimator):
     estimators_ : list of BaseEFC instances
         The collection of fitted sub-estimators. When the target
         is binary, this collection consists of only one estimator.
+        Their ``local_fields_`` and ``coupling_matrix_`` are views of
+        one array of shape (n_classes, n_features*(max_bin_-1),
+        n_features*(max_bin_-1) + 1) holding, row by row, the local
+        field followed by the coupling matrix row of each class, which
+        is the layout read by :meth:`predict`.
 
 
     """
@@ -76,6 +82,23 @@ class EnergyBasedFlowClassifier(ClassifierMixin, BaseEstimator):
     def _more_tags(self):
         return {"poor_score": True}
 
+    def _check_bins(self, X):
+        # checked before the cast to _bin_dtype, which would wrap values around
+        if np.min(X) < 0 or np.max(X) >= self.max_bin_:
+            raise ValueError(
+                "Categorical columns must be encoded as integers in the range "
+                f"[0, {self.max_bin_}), the range seen at fit."
+            )
+
+    def _bin_dtype(self):
+        # smallest integer type holding every bin, the energy and frequency
+        # kernels are bound by how fast they read X
+        if self.max_bin_ <= np.iinfo(np.uint8).max + 1:
+            return np.uint8
+        if self.max_bin_ <= np.iinfo(np.uint16).max + 1:
+            return np.uint16
+        return np.int64
+
     def fit(self, X, y, base_class=None, categorical_columns=[]):
         """Fit the Energy-based Flow Classifier model according to X.
 
@@ -122,9 +145,11 @@ class EnergyBasedFlowClassifier(ClassifierMixin, BaseEstimator):
 
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", category=UserWarning)
-            X = self.preprocessor_.fit_transform(X).astype("int64")
+            X = self.preprocessor_.fit_transform(X)
 
-        self.max_bin_ = np.max(X) + 1
+        self.max_bin_ = int(np.max(X)) + 1
+        self._check_bins(X)
+        X = np.ascontiguousarray(X, dtype=self._bin_dtype())
         self.n_features_in_ = X.shape[1]
         self.target_type_ = type_of_target(y)
         self.classes_, y = np.unique(y, return_inverse=True)
@@ -149,15 +174,58 @@ class EnergyBasedFlowClassifier(ClassifierMixin, BaseEstimator):
             ]
 
         else:
-            self.estimators_ = Parallel(n_jobs=self.n_jobs)(
+            # group the samples by class once, so each class is a contiguous
+            # block of rows instead of a separate fancy-indexed copy
+            order = np.argsort(y, kind="stable")
+            X_sorted = np.ascontiguousarray(X[order])
+            bounds = np.searchsorted(y[order], np.arange(len(self.classes_) + 1))
+
+            # the fitting kernels release the GIL, so threads avoid pickling
+            # each class subset to worker processes. Their OpenMP loops then
+            # run single threaded, one team per job would oversubscribe cores
+            n_threads = 1 if effective_n_jobs(self.n_jobs) > 1 else None
+            self.estimators_ = Parallel(n_jobs=self.n_jobs, prefer="threads")(
                 delayed(
-                    BaseEFC(self.max_bin_, self.pseudocounts, self.cutoff_quantile).fit
-                )(X[np.where(y == idx)[0], :])
+                    BaseEFC(
+                        self.max_bin_,
+                        self.pseudocounts,
+                        self.cutoff_quantile,
+                        n_threads,
+                    ).fit
+                )(X_sorted[bounds[idx] : bounds[idx + 1]])
                 for idx in range(len(self.classes_))
             )
 
+        self._pack_estimators()
+
         return self
 
+    def _pack_estimators(self):
+        # local fields and coupling matrix of every class packed row by row,
+        # the layout read by compute_energy_multi. The sub-estimators'
+        # attributes become views of it, so the matrices are stored once
+        self._coupling_fields = np.stack(
+            [
+                np.column_stack([estimator.local_fields_, estimator.coupling_matrix_])
+                for estimator in self.estimators_
+            ]
+        )
+        for estimator, coupling_fields in zip(self.estimators_, self._coupling_fields):
+            estimator.local_fields_ = coupling_fields[:, 0]
+            estimator.coupling_matrix_ = coupling_fields[:, 1:]
+
+    def __getstate__(self):
+        # the sub-estimators' views are pickled as arrays of their own, the
+        # packed copy is rebuilt from them by __setstate__
+        state = super().__getstate__().copy()
+        state.pop("_coupling_fields", None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        if hasattr(self, "estimators_"):
+            self._pack_estimators()
+
     def predict(self, X, return_energies=False, unknown_class=False):
         """
         Perform classification on samples in X.
@@ -194,37 +262,36 @@ class EnergyBasedFlowClassifier(ClassifierMixin, BaseEstimator):
 
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", category=UserWarning)
-            X = self.preprocessor_.transform(X).astype("int64")
+            X = self.preprocessor_.transform(X)
 
-        energies = np.array(
-            Parallel(n_jobs=self.n_jobs)(
-                delayed(estimator._compute_energy)(X) for estimator in self.estimators_
-            )
-        )
+        self._check_bins(X)
+        X = np.ascontiguousarray(X, dtype=self._bin_dtype())
 
-        y_energies = np.empty(X.shape[0], dtype="float64")
-        y_pred = np.empty(X.shape[0], dtype=self.classes_.dtype)
+        energies = compute_energy_multi(
+            self._coupling_fields, X, self.max_bin_, effective_n_jobs(self.n_jobs)
+        )
 
         if self.target_type_ == "binary":
-            for row in range(X.shape[0]):
-                y_energies[row] = energies[:, row]
-                if energies[:, row] < self.estimators_[0].cutoff_:
-                    y_pred[row] = self.classes_[self.base_class_idx_]
-                else:
-                    y_pred[row] = self.classes_[self.base_class_idx_ - 1]
+            y_energies = energies[0]
+            y_pred = np.where(
+                y_energies < self.estimators_[0].cutoff_,
+                self.classes_[self.base_class_idx_],
+                self.classes_[self.base_class_idx_ - 1],
+            )
 
         else:
-            for row in range(X.shape[0]):
-                min_energy = np.min(energies[:, row])
-                label_idx = np.where(energies[:, row] == min_energy)[0][0]
-                y_energies[row] = min_energy
-                y_pred[row] = self.classes_[label_idx]
-                if unknown_class:
-                    if min_energy > self.estimators_[label_idx].cutoff_:
-                        if np.issubdtype(self.classes_.dtype, np.number):
-                            y_pred[row] = -1
-                        else:
-                            y_pred[row] = "unknown"
+            label_idx = energies.argmin(axis=0)
+            y_energies = energies[label_idx, np.arange(X.shape[0])]
+            y_pred = self.classes_[label_idx]
+            if unknown_class:
+                cutoffs = np.array(
+                    [estimator.cutoff_ for estimator in self.estimators_]
+                )
+                unknown = y_energies > cutoffs[label_idx]
+                if np.issubdtype(self.classes_.dtype, np.number):
+                    y_pred[unknown] = -1
+                else:
+                    y_pred[unknown] = "unknown"
 
         if return_energies:
             return y_pred, y_energies
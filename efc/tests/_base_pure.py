@@ -25,7 +25,7 @@ class BaseEFC(ClassifierMixin, BaseEstimator):
     sitefreq_ : ndarray, shape (n_feature, max_bin)
       Observed frequency of attribute values ​​in each attribute.
 
-    pairfreq_ : ndarray, shape (n_feature, max_bin, n_feature, max_bin)
+    pairfreq_ : ndarray, shape (n_feature*max_bin, n_feature*max_bin)
         Observed frequency of attribute value pairs in attribute pairs.
 
     coupling_matrix_ : ndarray, shape (n_feature*max_bin, n_feature*max_bin)
@@ -110,7 +110,7 @@ class BaseEFC(ClassifierMixin, BaseEstimator):
                         pairfreq[i, ai, i, aj] = self.sitefreq_[i, ai]
                     else:
                         pairfreq[i, ai, i, aj] = 0.0
-        return pairfreq
+        return pairfreq.reshape(n_attr * self.max_bin, n_attr * self.max_bin)
 
     def _coupling(self):
         n_attr = self.sitefreq_.shape[0]
@@ -124,7 +124,9 @@ class BaseEFC(ClassifierMixin, BaseEstimator):
                         corr_matrix[
                             i * (self.max_bin - 1) + ai, j * (self.max_bin - 1) + aj
                         ] = (
-                            self.pairfreq_[i, ai, j, aj]
+                            self.pairfreq_[
+                                i * self.max_bin + ai, j * self.max_bin + aj
+                            ]
                             - self.sitefreq_[i, ai] * self.sitefreq_[j, aj]
                         )
 
@@ -34,3 +34,21 @@ def test_classifier(data):
 
     y_pred = clf.predict(X)
     assert y_pred.shape == (X.shape[0],)
+
+
+def test_unseen_categorical_code():
+    rng = np.random.RandomState(0)
+    X = np.column_stack([rng.randint(0, 5, 100), rng.rand(100)])
+    y = rng.randint(0, 2, 100)
+
+    clf = EnergyBasedFlowClassifier(n_bins=3)
+    clf.fit(X, y, categorical_columns=[0])
+    assert clf.max_bin_ == 5
+
+    # codes 50, 300 and 7 were never seen at fit
+    X_test = np.column_stack([[3, 50, 4, 300, 7], rng.rand(5)])
+    with pytest.raises(ValueError):
+        clf.predict(X_test)
+
+    with pytest.raises(ValueError):
+        clf.fit(np.column_stack([X[:, 0] - 1, X[:, 1]]), y, categorical_columns=[0])
@@ -1,8 +1,9 @@
 import pytest
 import numpy as np
+from types import SimpleNamespace
 
 from sklearn.datasets import load_iris
-from numpy.testing import assert_array_equal
+from numpy.testing import assert_array_equal, assert_allclose
 
 from sklearn.preprocessing import MaxAbsScaler, KBinsDiscretizer
 
@@ -11,6 +12,9 @@ from efc import local_fields
 from efc import site_freq
 from efc import pair_freq
 from efc import compute_energy
+from efc import compute_energy_multi
+from efc import EnergyBasedFlowClassifier
+from efc._base import BaseEFC as FastBaseEFC
 from _base_pure import BaseEFC
 import warnings
 
@@ -48,12 +52,106 @@ def test_extension(data):
     fields = local_fields(
         coupling_matrix, pairfreq, clf.sitefreq_, clf.pseudocounts, clf.max_bin
     )
-    coupling_matrix = np.log(coupling_matrix)
-    fields = np.log(fields)
 
     # assert python version with extension
     assert_array_equal(clf.sitefreq_, sitefreq)
     assert_array_equal(clf.pairfreq_, pairfreq)
-    assert_array_equal(clf.coupling_matrix_, coupling_matrix)
-    assert_array_equal(clf.local_fields_, fields)
+    # the extension works in log space, so results match up to rounding
+    assert_allclose(clf.coupling_matrix_, coupling_matrix, atol=1e-12)
+    assert_allclose(clf.local_fields_, fields, atol=1e-12)
     assert_array_equal(clf._compute_energy(X), compute_energy(clf, X))
+    # column-major input is accepted as well
+    assert_array_equal(
+        pairfreq,
+        pair_freq(np.asfortranarray(X), sitefreq, clf.pseudocounts, clf.max_bin),
+    )
+    assert_array_equal(
+        compute_energy(clf, X), compute_energy(clf, np.asfortranarray(X))
+    )
+    assert_array_equal(
+        compute_energy_multi(
+            np.column_stack([clf.local_fields_, clf.coupling_matrix_])[np.newaxis],
+            X,
+            clf.max_bin,
+        ),
+        compute_energy(clf, X)[np.newaxis],
+    )
+
+
+def test_bins_out_of_range():
+    X = np.array([[0, 1], [2, 40]])
+    sitefreq = np.full((2, 5), 0.2)
+
+    with pytest.raises(ValueError):
+        site_freq(X, 0.5, 5)
+    with pytest.raises(ValueError):
+        pair_freq(X, sitefreq, 0.5, 5)
+    with pytest.raises(ValueError):
+        site_freq(-X, 0.5, 5)
+
+    model = SimpleNamespace(
+        max_bin=5, coupling_matrix_=np.zeros((8, 8)), local_fields_=np.zeros(8)
+    )
+    with pytest.raises(ValueError):
+        compute_energy(model, X)
+    with pytest.raises(ValueError):
+        compute_energy_multi(np.zeros((2, 8, 9)), X, 5)
+
+
+def test_model_shape_mismatch():
+    # parameters of a model fitted on 4 features with max_bin=5
+    model = SimpleNamespace(
+        max_bin=5, coupling_matrix_=np.zeros((16, 16)), local_fields_=np.zeros(16)
+    )
+
+    compute_energy(model, np.zeros((3, 4), dtype=int))
+    with pytest.raises(ValueError):
+        compute_energy(model, np.zeros((3, 40), dtype=int))
+    with pytest.raises(ValueError):
+        compute_energy_multi(np.zeros((2, 16, 17)), np.zeros((3, 40), dtype=int), 5)
+
+
+def test_frequency_shape_mismatch():
+    # frequencies of 4 features with max_bin=5
+    X = np.zeros((3, 4), dtype=int)
+    sitefreq = np.full((4, 5), 0.2)
+    pairfreq = np.full((20, 20), 0.04)
+
+    with pytest.raises(ValueError):
+        pair_freq(X, sitefreq[:, :3], 0.5, 5)
+    with pytest.raises(ValueError):
+        coupling(pairfreq[:10, :10], sitefreq, 0.5, 5)
+    with pytest.raises(ValueError):
+        coupling(pairfreq, sitefreq, 0.5, 6)
+    with pytest.raises(ValueError):
+        local_fields(np.zeros((8, 8)), pairfreq, sitefreq, 0.5, 5)
+
+
+def test_n_threads():
+    X = np.array([[0, 1], [2, 4]])
+
+    assert_array_equal(site_freq(X, 0.5, 5, -1), site_freq(X, 0.5, 5, 1))
+    for n_threads in [0, -2]:
+        with pytest.raises(ValueError):
+            site_freq(X, 0.5, 5, n_threads)
+
+
+def test_compute_energy_multi(data):
+    X, y = data
+
+    clf = EnergyBasedFlowClassifier()
+    clf.fit(X, y)
+    _, y_energies = clf.predict(X, return_energies=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=UserWarning)
+        X = clf.preprocessor_.transform(X).astype("int")
+
+    # the classifier's packed parameters give one energy row per class,
+    # matching a model fitted on that class alone
+    energies = compute_energy_multi(clf._coupling_fields, X, clf.max_bin_)
+
+    assert energies.shape == (3, X.shape[0])
+    for label, row in enumerate(energies):
+        model = FastBaseEFC(clf.max_bin_).fit(X[y == label])
+        assert_array_equal(row, compute_energy(model, X))
+    assert_array_equal(energies.min(axis=0), y_energies)